@@ -0,0 +1,20 @@
+"""
+Ahead-of-time compiles the numba kernels of the simulation into the
+trading_kernels extension module, so that main.py does not pay the JIT
+compilation cost on start-up. Run it once from this directory:
+
+    python build_aot.py
+
+main.py imports trading_kernels when it is available and falls back to the
+JIT-compiled kernels otherwise.
+"""
+from numba.pycc import CC
+from main import _assign
+
+cc = CC('trading_kernels')
+
+# assign(sorted_idx, remaining_energy, consumer_count, loads, num_consumers) -> (consumers, hours) prosumer indices
+cc.export('assign', 'i4[:,:](i8[:,:], f8[:,:], i8[:,:], f8[:,:], i8)')(_assign.py_func)
+
+if __name__ == "__main__":
+    cc.compile()
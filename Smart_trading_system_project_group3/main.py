@@ -5,6 +5,15 @@ import matplotlib.pyplot as plt
 from trading_system import TradingSystem, TradingPartner, Consumer
 from optimization import TradingOptimization
 
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """ Fallback used when numba is not installed: the kernels run as plain Python."""
+        def decorator(func):
+            return func
+        return decorator
+
 def load_csv_data(price_file, load_file, production_file):
     """Load price and load curve data from CSV files."""
     price_data = pd.read_csv(price_file, index_col=0)
@@ -12,6 +21,33 @@ def load_csv_data(price_file, load_file, production_file):
     production_data = pd.read_csv(production_file, index_col=0)
     return price_data, load_data, production_data
 
+@njit(cache=True)
+def _assign(sorted_idx, remaining_energy, consumer_count, loads, num_consumers):
+    """
+    Assign each consumer, hour by hour, to the first prosumer in score order that
+    still has energy available and no consumer assigned. Works on NumPy arrays only
+    and updates remaining_energy and consumer_count in place.
+    Returns a (consumers, hours) matrix with the prosumer index, or -1 if none is available.
+    """
+    num_partners, sim_duration = remaining_energy.shape
+    assigned = np.full((num_consumers, sim_duration), -1, dtype=np.int32)
+    for hour in range(sim_duration):
+        for c in range(num_consumers):
+            for k in range(num_partners):
+                partner_index = sorted_idx[k, hour]
+                if remaining_energy[partner_index, hour] > 0 and consumer_count[partner_index, hour] < 1:
+                    assigned[c, hour] = partner_index
+                    remaining_energy[partner_index, hour] -= loads[partner_index, hour]
+                    consumer_count[partner_index, hour] += 1
+                    break
+    return assigned
+
+try:
+    # Ahead-of-time compiled version of _assign, built with build_aot.py
+    from trading_kernels import assign as _assign_kernel
+except ImportError:
+    _assign_kernel = _assign
+
 def assign_consumers_to_prosumers(trading_system, trading_partners, consumers, sim_duration, base_price_curve):
     """
     Assign consumers to prosumers based on the production capacity of the prosumers.
@@ -19,53 +55,55 @@ def assign_consumers_to_prosumers(trading_system, trading_partners, consumers, s
     they take does not exceed the energy injected by that prosumer in that hour.
     Also, each prosumer cannot have more than 1 consumer using their energy in an hour.
     If a consumer does not find an available prosumer, they use normal electricity prices.
+    Returns a (consumers, hours) matrix with the index of the assigned prosumer (-1 if none)
+    and a (consumers, hours) matrix with the normal electricity price paid when no prosumer
+    is available (NaN where the consumer is assigned to a prosumer).
     """
+    num_partners = len(trading_partners)
+    hours = np.arange(sim_duration)
+
     # Initialize a list to keep track of the remaining energy of each prosumer for each hour
-    remaining_energy = np.zeros((len(trading_partners), sim_duration))
-    for i, partner in enumerate(trading_partners):
-        for hour in range(sim_duration):
-            remaining_energy[i, hour] = trading_system.get_user_production(hour, i)
+    remaining_energy = trading_system._prod_matrix[:, :sim_duration].copy()
 
     # Initialize a list to keep track of the number of consumers assigned to each prosumer for each hour
-    consumer_count = np.zeros((len(trading_partners), sim_duration), dtype=int)
+    consumer_count = np.zeros((num_partners, sim_duration), dtype=np.int64)
 
-    # Initialize a dictionary to keep track of the assignments
-    assignments = {}
+    # Evaluate the score of every prosumer for every hour and sort them once (from best to worst)
+    score_matrix = trading_system._partners_soa.score_curves[:, :sim_duration]
+    sorted_idx = np.argsort(score_matrix, axis=0, kind='stable').astype(np.int64)
 
-    # Initialize a list to keep track of the normal energy prices for each consumer
-    normal_prices = {}
+    # Load taken from each prosumer when a consumer is assigned to it
+    loads = np.ascontiguousarray(trading_system.get_user_load(hours[None, :], np.arange(num_partners)[:, None]), dtype=float)
 
-    # Assign consumers to prosumers
-    for hour in range(sim_duration):
-        # Sort the prosumers based on the score (from best to worst)
-        sorted_partners = sorted(trading_partners, key=lambda x: x.score(hour))
-        
-        # Assign consumers to prosumers in order of score, respecting the constraints
-        for consumer in consumers:
-            best_prosumer = None
-            for partner in sorted_partners:
-                partner_index = trading_partners.index(partner)
-                # Verify that the prosumer has energy available and does not already have 1 consumer assigned
-                if remaining_energy[partner_index, hour] > 0 and consumer_count[partner_index, hour] < 1:
-                    best_prosumer = (partner, partner_index)
-                    break
+    # Assign consumers to prosumers in order of score, respecting the constraints
+    assign_idx = _assign_kernel(sorted_idx, remaining_energy, consumer_count, loads, len(consumers))
 
-            # Assign the consumer to the prosumer and reduce the remaining energy
-            if best_prosumer:
-                partner, partner_index = best_prosumer
-                assignments[(consumer, hour)] = partner
-                load = trading_system.get_user_load(hour, partner_index)
-                remaining_energy[partner_index, hour] -= load
-                consumer_count[partner_index, hour] += 1
-            else:
-                # If no prosumer is available, use normal electricity prices
-                normal_prices[(consumer, hour)] = base_price_curve[hour]
+    # If no prosumer is available, use normal electricity prices
+    normal_prices = np.where(assign_idx < 0, np.asarray(base_price_curve[:sim_duration], dtype=float), np.nan)
+
+    return assign_idx, normal_prices
 
-    return assignments, normal_prices
+def _plot_curves(ax, curves, labels, **kwargs):
+    """ Plots every row of curves against the hours with a single call and labels the resulting lines."""
+    curves = np.asarray(curves, dtype=float)
+    if curves.size == 0:
+        return []
+    lines = ax.plot(np.arange(curves.shape[1]), curves.T, **kwargs)
+    for line, label in zip(lines, labels):
+        line.set_label(label)
+    return lines
 
-def main():
+def _draw_contrib(ax, trading_partners, trading_quantities, distributed_load_curves, consumers):
+    """ Plots the energy injected and consumed by the prosumers and the energy consumed by the consumers."""
+    num_partners = len(trading_partners)
+    _plot_curves(ax, trading_quantities, [f"{partner.name} Injected" for partner in trading_partners])
+    _plot_curves(ax, distributed_load_curves[:num_partners], [f"{partner.name} Consumed" for partner in trading_partners], linestyle='--')
+    _plot_curves(ax, distributed_load_curves[num_partners:], [f"{consumer.name} Consumed" for consumer in consumers], linestyle=':')
+
+def main(seed=None):
     # Simulation
     sim_duration = 24  # Duration in hours
+    rng = np.random.default_rng(seed)  # Single random generator for the whole simulation
     while True:
         try:
             simulation_day = input("Enter the day of the week for the simulation (e.g., 'Sunday'): ").capitalize()
@@ -112,11 +150,15 @@ def main():
         constraints = json.load(fp)
 
     # Define trading partners
+    capacities = rng.uniform(15, 25, size=number_prosumer)
+    reliabilities = rng.uniform(0.85, 0.95, size=number_prosumer)
+    price_variations = rng.uniform(0.95, 1.05, size=(number_prosumer, len(base_price_curve)))
     trading_partners = [
         TradingPartner(name=f"Producer {chr(65 + i)}", 
-                       capacity=np.random.uniform(15, 25), 
-                       reliability=np.random.uniform(0.85, 0.95),
-                       base_price_curve=base_price_curve)
+                       capacity=capacities[i], 
+                       reliability=reliabilities[i],
+                       base_price_curve=base_price_curve,
+                       price_variation=price_variations[i])
         for i in range(number_prosumer)
     ]
 
@@ -127,13 +169,13 @@ def main():
     ]
 
     # Create the trading system
-    trading_system = TradingSystem(load_curve, base_price_curve, production_curve, constraints, trading_partners, consumers)
+    trading_system = TradingSystem(load_curve, base_price_curve, production_curve, constraints, trading_partners, consumers, rng=rng)
 
     # Distribute the total load to the partners
     distributed_load_curves = trading_system.distribute_load_curve()
 
     # Assign consumers to prosumers with the new policy
-    assignments, normal_prices = assign_consumers_to_prosumers(trading_system, trading_partners, consumers, sim_duration, base_price_curve)
+    assign_idx, normal_prices = assign_consumers_to_prosumers(trading_system, trading_partners, consumers, sim_duration, base_price_curve)
 
     trading_optimization = TradingOptimization(trading_system)
     trading_quantities, trading_prices, partner_details = trading_optimization.optimize_trading()
@@ -141,38 +183,39 @@ def main():
     # Print the details of the assignments
     print("------------" * 10)
     print("\nSelection of the best prosumers for each consumer:")
-    for consumer in consumers:
-        print(f"\n{consumer.name}:")
+    for i, consumer in enumerate(consumers):
+        lines = [f"\n{consumer.name}:"]
         for hour in range(sim_duration):
-            best_prosumer = assignments.get((consumer, hour), None)
-            if best_prosumer:
-                print(f"  Hour {hour}: selects {best_prosumer.name} with score {best_prosumer.score(hour):.4f}")
+            partner_index = assign_idx[i, hour]
+            if partner_index >= 0:
+                best_prosumer = trading_partners[partner_index]
+                lines.append(f"  Hour {hour}: selects {best_prosumer.name} with score {best_prosumer.score(hour):.4f}")
             else:
-                print(f"  Hour {hour}: No prosumer available. Using normal electricity prices: {normal_prices.get((consumer, hour), 'N/A'):.4f}")
+                lines.append(f"  Hour {hour}: No prosumer available. Using normal electricity prices: {normal_prices[i, hour]:.4f}")
+        print("\n".join(lines))
 
     # Print the trading details
     print("\nTrading Details:")
     for i, partner in enumerate(trading_partners):
-        print(f"\nPartner: {partner.name}, Scores: {[partner.score(hour) for hour in range(sim_duration)]}")
-        for hour in range(sim_duration):
-            consumed = distributed_load_curves[i][hour]
-            injected = trading_quantities[i][hour]
-            price = trading_prices[i][hour]
-            print(f"  Hour {hour}: Consumed: {consumed:.2f}, Injected: {injected:.2f}, Price: {price:.2f}")
-        print("-" * 50)
+        scores = np.array2string(partner.score_curve, precision=4, separator=', ', max_line_width=np.inf)
+        hourly = "\n".join(
+            f"  Hour {hour}: Consumed: {consumed:.2f}, Injected: {injected:.2f}, Price: {price:.2f}"
+            for hour, (consumed, injected, price) in enumerate(zip(distributed_load_curves[i], trading_quantities[i], trading_prices[i]))
+        )
+        print(f"\nPartner: {partner.name}, Scores: {scores}\n{hourly}\n" + "-" * 50)
 
     # Print the consumption of the consumers
     print("\nConsumer Consumption:")
     for i, consumer in enumerate(consumers):
-        print(f"\nConsumer {consumer.name} Load: {consumer.load:.2f} kW")
-        for hour in range(sim_duration):
-            load = distributed_load_curves[i + len(trading_partners)][hour]
-            print(f"  Hour {hour}: Consumed: {load:.2f} kW")
+        hourly = "\n".join(
+            f"  Hour {hour}: Consumed: {load:.2f} kW"
+            for hour, load in enumerate(distributed_load_curves[i + len(trading_partners)])
+        )
+        print(f"\nConsumer {consumer.name} Load: {consumer.load:.2f} kW\n{hourly}")
 
     # Plot: Prices of the prosumers
     fig, ax = plt.subplots(figsize=(12, 7))
-    for i, partner in enumerate(trading_partners):
-        ax.plot(range(sim_duration), trading_prices[i], label=f"{partner.name} Price", linestyle='--')
+    _plot_curves(ax, trading_prices, [f"{partner.name} Price" for partner in trading_partners], linestyle='--')
 
     ax.set_xlabel('Hour')
     ax.set_ylabel('Price (€/kWh)')
@@ -181,16 +224,10 @@ def main():
     ax.grid()
     plt.show()
 
-    # Plot: Contributes of the partners (consumption, injection) and total load
+    # Plot: Contributes of the partners (consumption, injection) and total load,
+    # i.e. the energy injected and consumed by the various actors
     fig, ax = plt.subplots(figsize=(12, 7))
-    for i, partner in enumerate(trading_partners):
-        ax.plot(range(sim_duration), trading_quantities[i], label=f"{partner.name} Injected")
-        ax.plot(range(sim_duration), distributed_load_curves[i], label=f"{partner.name} Consumed", linestyle='--')
-
-    # Power consumed by consumers
-    for i, consumer in enumerate(consumers):
-        ax.plot(range(sim_duration), distributed_load_curves[i + len(trading_partners)], label=f"{consumer.name} Consumed", linestyle=':')
-
+    _draw_contrib(ax, trading_partners, trading_quantities, distributed_load_curves, consumers)
     ax.plot(range(sim_duration), total_load_curve, label="Total Load Curve", color='black', linewidth=2)
     ax.set_xlabel('Hours')
     ax.set_ylabel('Load (kW)')
@@ -199,22 +236,6 @@ def main():
     ax.grid()
     plt.show()
 
-    # Plot: Energy injected and consumed by various actors
-    fig, ax = plt.subplots(figsize=(12, 7))
-    for i, partner in enumerate(trading_partners):
-        ax.plot(range(sim_duration), trading_quantities[i], label=f"{partner.name} Injected")
-        ax.plot(range(sim_duration), distributed_load_curves[i], label=f"{partner.name} Consumed", linestyle='--')
-
-    for i, consumer in enumerate(consumers):
-        ax.plot(range(sim_duration), distributed_load_curves[i + len(trading_partners)], label=f"{consumer.name} Consumed", linestyle=':')
-
-    ax.set_xlabel('Hour')
-    ax.set_ylabel('Energy (kW)')
-    ax.set_title(f'Energy Injected and Consumed by Various Actors - {simulation_day}')
-    ax.legend()
-    ax.grid()
-    plt.show()
-
 
     # Plot: Energy injected and consumed by each partner separately
     for i, partner in enumerate(trading_partners):
@@ -230,22 +251,18 @@ def main():
 
     # Plot: Price of single consumer with score policy vs random policy
     fig, ax = plt.subplots(figsize=(12, 7))
-    for i, consumer in enumerate(consumers):
-        # Price with score policy
-        price_with_score = []
-        for hour in range(sim_duration):
-            best_prosumer = assignments.get((consumer, hour), None)
-            if best_prosumer:
-                price_with_score.append(best_prosumer.price_curve[hour])
-            else:
-                # If no prosumer is available, use normal electricity prices
-                price_with_score.append(normal_prices.get((consumer, hour), base_price_curve[hour]))
-        
-        ax.plot(range(sim_duration), price_with_score, label=f"{consumer.name} (Score Policy)", linestyle='-')
-
-        # Price with random policy
-        price_random = [trading_partners[np.random.randint(0, len(trading_partners))].price_curve[hour] for hour in range(sim_duration)]
-        ax.plot(range(sim_duration), price_random, label=f"{consumer.name} (Random Policy)", linestyle='--')
+    hours = np.arange(sim_duration)
+    price_matrix = trading_system._partners_soa.price_curves[:, :sim_duration]
+
+    # Price with score policy, if no prosumer is available use normal electricity prices
+    prices_with_score = np.where(assign_idx >= 0, price_matrix[assign_idx, hours], normal_prices)
+
+    # Price with random policy
+    random_idx = rng.integers(0, len(trading_partners), size=(len(consumers), sim_duration))
+    prices_random = price_matrix[random_idx, hours]
+
+    _plot_curves(ax, prices_with_score, [f"{consumer.name} (Score Policy)" for consumer in consumers], linestyle='-')
+    _plot_curves(ax, prices_random, [f"{consumer.name} (Random Policy)" for consumer in consumers], linestyle='--')
 
     ax.set_xlabel('Hour')
     ax.set_ylabel('Price (€/kWh)')
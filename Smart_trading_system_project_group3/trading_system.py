@@ -1,20 +1,44 @@
 import numpy as np
 
 class TradingPartner:
-    def __init__(self, name, capacity, reliability, base_price_curve):
+    def __init__(self, name, capacity, reliability, base_price_curve, price_variation=None):
         self.name = name
         self.capacity = capacity
         self.reliability = reliability
-        # Initialize individual price curve with a 5% variation
-        variazione = np.random.uniform(0.95, 1.05, size=len(base_price_curve))
+        # Initialize individual price curve with a 5% variation, drawn here if not provided
+        if price_variation is None:
+            price_variation = np.random.default_rng().uniform(0.95, 1.05, size=len(base_price_curve))
+        variazione = np.asarray(price_variation, dtype=float)
         self.price_curve = base_price_curve * variazione
+        # Cache the score of every hour, the formula is price / (capacity * reliability)
+        self.score_curve = self.price_curve / (self.capacity * self.reliability)
 
     def score(self, hour):
-        """ Evaluates the score based on the formula price / (capacity * reliability)."""
-        return self.price_curve[hour] / (self.capacity * self.reliability)
+        """ Returns the score of the given hour based on the formula price / (capacity * reliability)."""
+        return self.score_curve[hour]
+
+class PartnersSoA:
+    """ Struct-of-arrays layout of the trading partners: row i of every matrix belongs to partner i."""
+    def __init__(self, trading_partners, duration):
+        num_partners = len(trading_partners)
+        self.names = [partner.name for partner in trading_partners]
+        self.capacity = np.array([partner.capacity for partner in trading_partners], dtype=float)
+        self.reliability = np.array([partner.reliability for partner in trading_partners], dtype=float)
+        self.price_curves = np.array([partner.price_curve for partner in trading_partners], dtype=float).reshape(num_partners, duration)
+        self.score_curves = np.empty_like(self.price_curves)
+        self.update_scores()
+
+        # The partners keep views on their rows, so their curves always follow the matrices
+        for i, partner in enumerate(trading_partners):
+            partner.price_curve = self.price_curves[i]
+            partner.score_curve = self.score_curves[i]
+
+    def update_scores(self):
+        """ Re-evaluates the scores after the price curves have changed, the formula is price / (capacity * reliability)."""
+        np.divide(self.price_curves, (self.capacity * self.reliability)[:, None], out=self.score_curves)
 
 class TradingSystem:
-    def __init__(self, load_curve, base_price_curve, production_curve, constraints, trading_partners, consumers):
+    def __init__(self, load_curve, base_price_curve, production_curve, constraints, trading_partners, consumers, rng=None):
         self.load_curve = load_curve
         self.base_price_curve = base_price_curve
         self.constraints = constraints
@@ -25,11 +49,23 @@ class TradingSystem:
         num_partners = len(trading_partners)
         num_consumers = len(consumers)
         num_actors = num_partners + num_consumers
-        self.load_distribution = np.random.dirichlet(np.ones(num_actors), size=1)[0]  # random percentages
+        if rng is None:
+            rng = np.random.default_rng()
+        self.load_distribution = rng.dirichlet(np.ones(num_actors))  # random percentages
+        self._distributed = None  # distributed load curves, evaluated on first use
+        self._partners_soa = PartnersSoA(trading_partners, len(load_curve))
+
+        # Production is calculated based on the prosumer's capacity and a Gaussian curve
+        peak_hour = 12
+        sigma = 4
+        hours = np.arange(len(load_curve))
+        self._prod_gauss = np.exp(-0.5 * ((hours - peak_hour) / sigma) ** 2)
+        self._prod_gauss /= np.exp(-0.5 * ((0 - peak_hour) / sigma) ** 2) # Normalizes with respect to the peak
+        self._prod_matrix = self._partners_soa.capacity[:, None] * (0.95 + 0.1 * self._prod_gauss)[None, :]  # Variation between 95% and 105%
 
     def get_price(self, partner_index, hour):
         """ Returns the price for a specific hour and prosumer."""
-        return self.trading_partners[partner_index].price_curve[hour]
+        return self._partners_soa.price_curves[partner_index, hour]
 
     def get_user_load(self, hour, partner_index):
         """ Returns the load for a specific hour and partner."""
@@ -38,48 +74,30 @@ class TradingSystem:
 
     def get_user_production(self, hour, partner_index):
         """ Returns the production for a specific hour and partner."""
-        # Production is calculated based on the prosumer's capacity and a Gaussian curve
-        partner = self.trading_partners[partner_index]
-        peak_hour = 12
-        sigma = 4
-        gaussian_value = np.exp(-0.5 * ((hour - peak_hour) / sigma) ** 2)
-        gaussian_value /= np.exp(-0.5 * ((0 - peak_hour) / sigma) ** 2) # Normalizes with respect to the peak
-        production = partner.capacity * (0.95 + 0.1 * gaussian_value)  # Variation between 95% and 105%
-        return production
+        return self._prod_matrix[partner_index, hour]
 
     def distribute_load_curve(self):
         """ Distributes the total load curve to the partners following the percentages."""
-        num_partners = len(self.trading_partners)
-        num_consumers = len(self.consumers)
-        num_actors = num_partners + num_consumers
-        distributed_curves = np.zeros((num_actors, len(self.load_curve)))
-        
+        # The load curve and the percentages do not change after construction, so the result is cached
+        if self._distributed is not None:
+            return self._distributed
+
         # Evaluate the total load curve (load_curve * number_prosumer)
         total_load_curve = self.load_curve * len(self.trading_partners)
 
-        # Distribute the load based on the percentages
-        for i in range(num_actors):
-            distributed_curves[i] = total_load_curve * self.load_distribution[i]
-
-        # Normalizes the distributed curves to ensure that the sum is equal to the total load curve
-        sum_distributed = np.sum(distributed_curves, axis=0)
-        normalization_factors = total_load_curve / sum_distributed
-        distributed_curves = distributed_curves * normalization_factors
+        # Distribute the load based on the percentages, they already sum up to 1
+        # so the sum of the distributed curves is equal to the total load curve
+        distributed_curves = np.outer(self.load_distribution, total_load_curve)
 
+        self._distributed = distributed_curves
         return distributed_curves
 
     def select_best_prosumer_for_consumer(self, consumer, hour):
         """ Selects the best prosumer for a consumer based on the score at the given hour."""
-        best_score = float('inf')
-        best_prosumer = None
-
-        for partner in self.trading_partners:
-            score = partner.score(hour)
-            if score < best_score:
-                best_score = score
-                best_prosumer = partner
+        if not self.trading_partners:
+            return None
 
-        return best_prosumer
+        return self.trading_partners[int(np.argmin(self._partners_soa.score_curves[:, hour]))]
 
 class Consumer:
     def __init__(self, name, load):